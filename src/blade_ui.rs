@@ -206,9 +206,9 @@ impl BladeUi {
         let packets = packet.split("|");
         
         for packet in packets {
-            let packet_parts: Vec<String> = packet.split(":").map(|s| s.to_string()).collect();
+            let packet_parts: Vec<&str> = packet.split(":").collect();
             
-            match packet_parts[0].as_str() {
+            match packet_parts[0] {
                 _ => { println!("WARNING: Unknown packet ID: {}", packet_parts[0]) },
             }
         }
@@ -666,9 +666,9 @@ impl NavigationUi {
         let packets = packet.split("|");
 
         for packet in packets {
-            let packet_parts: Vec<String> = packet.split(":").map(|s| s.to_string()).collect();
+            let packet_parts: Vec<&str> = packet.split(":").collect();
 
-            match packet_parts[0].as_str() {
+            match packet_parts[0] {
                 "GPS" => {
                     if packet_parts.len() == 6 {
                         self.latitude = packet_parts[1].parse().ok();
@@ -806,11 +806,11 @@ impl TelemetryUi {
         let packets = packet.split("|");
         
         for packet in packets {
-            let packet_parts: Vec<String> = packet.split(":").map(|s| s.to_string()).collect();
+            let packet_parts: Vec<&str> = packet.split(":").collect();
 
             //println!("{:?}", packet_parts);
 
-            match packet_parts[0].as_str() {
+            match packet_parts[0] {
                 "VOLT" => {
                     /////////////////////
                     self.h_48_v.add_value(packet_parts[1].parse().unwrap_or(0.0));
@@ -1,18 +1,9 @@
-use std::fs::File;
-use std::io::{
-    BufWriter,
-    Write,
-};
-use std::mem;
-use std::path::Path;
 use std::ptr;
-use std::slice;
 use std::sync::{Arc, Mutex};
 use std::sync::mpsc::{channel, Sender, Receiver};
 use std::thread;
 
 use ffmpeg;
-use ffmpeg::codec;
 use ffmpeg::format;
 use ffmpeg::media;
 use ffmpeg::frame;
@@ -22,6 +13,9 @@ use image::DynamicImage;
 
 use piston_window::{PistonWindow, G2dTexture, TextureSettings};
 
+// Enables per-packet diagnostic output on the video threads
+const DEBUG: bool = false;
+
 pub enum VideoMsg {
     Start(String),
     Stop,
@@ -46,7 +40,11 @@ pub fn start_video_stream<'a>(window: &mut PistonWindow,
             let fps: i64 = 10;
 
             //let mut format_context = format::input_with(&path, dict!{"rtsp_transport" => "tcp"}).unwrap();
-            let mut format_context = format::input(&path).unwrap();
+            // Ask for a 4MiB RTP socket receive buffer so bursts of UDP packets aren't dropped by the
+            // kernel while we're busy decoding. Linux caps this at net.core.rmem_max (~208KiB by
+            // default, and libavformat only logs a warning), so it only takes full effect if
+            // rmem_max is raised on the ground station, e.g. `sysctl -w net.core.rmem_max=4194304`.
+            let mut format_context = format::input_with(&path, dict!{"buffer_size" => "4194304"}).unwrap();
             //format::dump(&format_context, 0, Some(path.as_str()));
 
             let (start_time, stream_codec) =
@@ -54,12 +52,13 @@ pub fn start_video_stream<'a>(window: &mut PistonWindow,
                               .filter(|stream| stream.codec().medium() == media::Type::Video)
                               .map(|stream| (stream.start_time(), stream.codec()))
                               .next().expect("No video streams in stream");
-            let video_codec = codec::decoder::find(stream_codec.id()).unwrap();
             
             let codec_context = stream_codec.clone();
 
             let mut decoder = codec_context.decoder().video().unwrap();
-            println!("ASDF {} {}", decoder.width(), decoder.height());
+            if DEBUG {
+                println!("Video decoder {}x{}", decoder.width(), decoder.height());
+            }
             let mut sws_context = scaling::Context::get(decoder.format(), decoder.width(), decoder.height(),
                                                     Pixel::RGBA, image_size, image_size,
                                                     scaling::flag::BILINEAR).unwrap();
@@ -73,32 +72,44 @@ pub fn start_video_stream<'a>(window: &mut PistonWindow,
             let mut start = ffmpeg::time::relative() as i64;
             let sleep = 1_000_000/fps;
             
-            let mut rec_start_pts = 0;
+            // The scaled frame never leaves this thread, so allocate it once and reuse it. The
+            // input frame is handed off to the recording thread, so it has to be fresh each time,
+            // but it can start out empty since the decoder attaches its own picture buffers.
+            let mut output_frame = frame::Video::new(Pixel::RGBA, image_size, image_size);
             
             for (stream, packet) in format_context.packets() {
-                let mut input_frame = frame::Video::new(decoder.format(), decoder.width(), decoder.height());
-                let mut output_frame = frame::Video::new(Pixel::RGBA, image_size, image_size);
+                let mut input_frame = frame::Video::empty();
 
-                decoder.decode(&packet, &mut input_frame).unwrap();
-                
-                if let Err(e) = sws_context.run(&input_frame, &mut output_frame) {
-                    println!("WARNING: video software scaling error: {}", e);
-                }
+                let got_frame = decoder.decode(&packet, &mut input_frame).unwrap();
+
+                // Packets that don't complete a picture leave nothing to scale or display
+                if got_frame {
+                    if let Err(e) = sws_context.run(&input_frame, &mut output_frame) {
+                        println!("WARNING: video software scaling error: {}", e);
+                    }
                 
-                // Copy frame data to the rgba_img
-                {
-                    let frame_data = output_frame.data(0);
-                    //println!("FOO {} {}", output_frame.planes(), frame_data.len());
-                    let mut rgba_img = thread_rgba_img.lock().unwrap();
-                    unsafe {
-                        for y in 0..output_frame.height() {
+                    // Copy frame data to the rgba_img
+                    {
+                        let frame_data = output_frame.data(0);
+                        //println!("FOO {} {}", output_frame.planes(), frame_data.len());
+                        let mut rgba_img = thread_rgba_img.lock().unwrap();
+                        unsafe {
                             let line_size = (*output_frame.as_ptr()).linesize[0] as usize;
-                            let offset = (y as usize) * line_size;
-                            let dst_offset = (y as usize) * (image_size as usize)*4;
-                            //println!("{} {} {} {} {} {}", offset, dst_offset, frame_data[offset], frame_data[offset+1], frame_data[offset+2], frame_data[offset+3]);
-                            let src: *const u8 = mem::transmute(frame_data.get(offset));
-                            let dst = rgba_img.as_mut_rgba8().unwrap().as_mut_ptr().offset(dst_offset as isize);
-                            ptr::copy(src, dst, (image_size as usize)*4);
+                            let row_size = (image_size as usize)*4;
+                            let src = frame_data.as_ptr();
+                            let dst = rgba_img.as_mut_rgba8().unwrap().as_mut_ptr();
+                            if line_size == row_size {
+                                // No padding between rows, so the whole plane can be copied at once
+                                ptr::copy_nonoverlapping(src, dst, row_size*(output_frame.height() as usize));
+                            } else {
+                                for y in 0..(output_frame.height() as usize) {
+                                    let offset = y * line_size;
+                                    let dst_offset = y * row_size;
+                                    ptr::copy_nonoverlapping(src.offset(offset as isize),
+                                                             dst.offset(dst_offset as isize),
+                                                             row_size);
+                                }
+                            }
                         }
                     }
                 }
@@ -110,7 +121,6 @@ pub fn start_video_stream<'a>(window: &mut PistonWindow,
                             VideoMsg::Start(out_path) => {
                                 // Open recording stream
                                 if video_t.is_none() {
-                                    rec_start_pts = packet.pts().unwrap();
                                     start = ffmpeg::time::relative() as i64;
                                     let (t, r) = channel();
                                     start_video_recording(&decoder, r, out_path);
@@ -127,20 +137,19 @@ pub fn start_video_stream<'a>(window: &mut PistonWindow,
                     }
                 }
 
-                if let Some(ref video_t) = video_t {
-                    /*let pts = packet.pts()
-                                    .unwrap_or(((ffmpeg::time::relative() as i64) - start)/sleep);*/
-                    let pts = ((ffmpeg::time::relative() as i64) - start)/sleep;
-                    //let pts = (input_frame.timestamp().unwrap()-start_time)/sleep;
-                    /*let pts = packet.pts().unwrap();
-                    let pts =
-                        if pts > rec_start_pts {
-                            pts - rec_start_pts
-                        } else {
-                            0
-                        };*/
-                    println!("PTS {}, {:?}, {}", pts, packet.pts().unwrap()/10_000, packet.position());
-                    video_t.send(RecordPacket::Packet(pts, input_frame));
+                // Only pictures get recorded; an empty frame would just make the recorder's
+                // converter fail and re-encode its previous frame
+                if got_frame {
+                    if let Some(ref video_t) = video_t {
+                        /*let pts = packet.pts()
+                                        .unwrap_or(((ffmpeg::time::relative() as i64) - start)/sleep);*/
+                        let pts = ((ffmpeg::time::relative() as i64) - start)/sleep;
+                        //let pts = (input_frame.timestamp().unwrap()-start_time)/sleep;
+                        if DEBUG {
+                            println!("PTS {}, {:?}, {}", pts, packet.pts().map(|pts| pts/10_000), packet.position());
+                        }
+                        video_t.send(RecordPacket::Packet(pts, input_frame));
+                    }
                 }
             }
         }).unwrap();
@@ -160,7 +169,9 @@ fn start_video_recording(decoder: &ffmpeg::codec::decoder::Video,
     let decoder_height = decoder.height();
     let decoder_format = decoder.format();
 
-    println!("time_base={}", decoder.time_base());
+    if DEBUG {
+        println!("time_base={}", decoder.time_base());
+    }
     
     thread::Builder::new()
         .name("video_packet_in".to_string())